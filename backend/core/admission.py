@@ -0,0 +1,195 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+from loguru import logger
+
+
+class AdmissionRejected(Exception):
+    """処理能力を超えたため受け付けられなかったリクエスト"""
+
+    def __init__(self, reason: str, retry_after: Optional[int]):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class PayloadTooLarge(AdmissionRejected):
+    """単体で保持バイト数の上限を超えるため、再試行しても受け付けられないリクエスト"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason, None)
+
+
+class AdmissionController:
+    """解析処理の同時実行数・待機数・保持バイト数・セッション数を制限し、超過分を早期に破棄する"""
+
+    def __init__(
+        self,
+        max_inflight: int = 4,
+        max_waiting: int = 4,
+        max_queued_bytes: int = 256 * 1024 * 1024,
+        max_sessions: int = 8,
+        queue_timeout: float = 0.5,
+        retry_after: int = 5,
+        metrics_window: float = 60.0
+    ):
+        self.max_inflight = max_inflight
+        self.max_waiting = max_waiting
+        self.max_queued_bytes = max_queued_bytes
+        self.max_sessions = max_sessions
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.metrics_window = metrics_window
+
+        self._semaphore = asyncio.Semaphore(max_inflight)
+        self.inflight = 0
+        self.waiting = 0
+        self.queued_bytes = 0  # 待機中および処理中のリクエストが保持している画像のデコード後のバイト数
+        self.sessions = 0
+
+        self.started_at = time.time()
+        self.admitted = 0
+        self.shed: Dict[str, int] = {
+            "too_large": 0,
+            "queue_full": 0,
+            "queued_bytes": 0,
+            "timeout": 0
+        }
+        self.sessions_opened = 0
+        self.sessions_rejected = 0
+
+        # 直近metrics_window秒の受付・破棄を集計するためのイベント履歴 (時刻, 受け付けたか)
+        self._analysis_events: Deque[Tuple[float, bool]] = deque()
+        self._session_events: Deque[Tuple[float, bool]] = deque()
+        logger.info(
+            f"AdmissionController initialized: max_inflight={max_inflight}, "
+            f"max_waiting={max_waiting}, max_queued_bytes={max_queued_bytes}, "
+            f"max_sessions={max_sessions}, queue_timeout={queue_timeout}s"
+        )
+
+    def _record(self, events: Deque[Tuple[float, bool]], accepted: bool) -> None:
+        now = time.monotonic()
+        events.append((now, accepted))
+        self._prune(events, now)
+
+    def _prune(self, events: Deque[Tuple[float, bool]], now: float) -> None:
+        while events and events[0][0] < now - self.metrics_window:
+            events.popleft()
+
+    def _recent(self, events: Deque[Tuple[float, bool]], accepted_key: str, rejected_key: str, rate_key: str) -> Dict:
+        self._prune(events, time.monotonic())
+        accepted = sum(1 for _, is_accepted in events if is_accepted)
+        rejected = len(events) - accepted
+        return {
+            accepted_key: accepted,
+            rejected_key: rejected,
+            rate_key: rejected / len(events) if events else 0.0
+        }
+
+    def _shed(self, reason: str, message: str) -> AdmissionRejected:
+        self.shed[reason] += 1
+        self._record(self._analysis_events, False)
+        logger.warning(f"Analysis shed ({reason}): {message}")
+        if reason == "too_large":
+            return PayloadTooLarge(message)
+        return AdmissionRejected(message, self.retry_after)
+
+    def check_capacity(self) -> None:
+        """
+        実行枠と待機枠がすべて埋まっていればAdmissionRejectedを送出する（待機はしない）
+        リクエスト本文を読み込む前に呼び出し、破棄されるリクエストのためにメモリを使わないようにする
+        """
+        if self.inflight + self.waiting >= self.max_inflight + self.max_waiting:
+            raise self._shed(
+                "queue_full",
+                f"Analysis queue is full ({self.waiting}/{self.max_waiting} waiting)"
+            )
+
+    @asynccontextmanager
+    async def admit(self, size: int) -> AsyncIterator[None]:
+        """
+        解析処理の実行枠を確保する
+        sizeはリクエストが保持するデコード後の画像サイズ（バイト）
+        単体で保持バイト数の上限を超える場合はPayloadTooLargeを、
+        待機数や保持バイト数の上限を超える場合は即座に、queue_timeout以内に枠が空かない場合は待機後にAdmissionRejectedを送出
+        """
+        if size > self.max_queued_bytes:
+            raise self._shed(
+                "too_large",
+                f"Image is too large to analyze ({size}/{self.max_queued_bytes} bytes)"
+            )
+        if self.queued_bytes + size > self.max_queued_bytes:
+            raise self._shed(
+                "queued_bytes",
+                f"Queued bytes limit exceeded ({self.queued_bytes + size}/{self.max_queued_bytes})"
+            )
+        self.check_capacity()
+
+        self.queued_bytes += size
+        try:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise self._shed(
+                    "timeout",
+                    f"No analysis slot available within {self.queue_timeout}s"
+                )
+            finally:
+                self.waiting -= 1
+
+            self.inflight += 1
+            self.admitted += 1
+            self._record(self._analysis_events, True)
+            try:
+                yield
+            finally:
+                self.inflight -= 1
+                self._semaphore.release()
+        finally:
+            self.queued_bytes -= size
+
+    def open_session(self) -> None:
+        """解析セッションの枠を確保する（上限を超える場合はAdmissionRejectedを送出）"""
+        if self.sessions >= self.max_sessions:
+            self.sessions_rejected += 1
+            self._record(self._session_events, False)
+            message = f"Session limit reached ({self.sessions}/{self.max_sessions})"
+            logger.warning(f"Session rejected: {message}")
+            raise AdmissionRejected(message, self.retry_after)
+        self.sessions += 1
+        self.sessions_opened += 1
+        self._record(self._session_events, True)
+
+    def close_session(self) -> None:
+        self.sessions = max(self.sessions - 1, 0)
+
+    def get_metrics(self) -> Dict:
+        """起動からの累計件数と、直近metrics_window秒の解析処理・セッションそれぞれの破棄率を返す"""
+        return {
+            "limits": {
+                "max_inflight": self.max_inflight,
+                "max_waiting": self.max_waiting,
+                "max_queued_bytes": self.max_queued_bytes,
+                "max_sessions": self.max_sessions,
+                "queue_timeout": self.queue_timeout,
+                "metrics_window": self.metrics_window
+            },
+            "analyses": {
+                "inflight": self.inflight,
+                "waiting": self.waiting,
+                "queued_bytes": self.queued_bytes,
+                "admitted": self.admitted,
+                "shed": dict(self.shed),
+                "recent": self._recent(self._analysis_events, "admitted", "shed", "shed_rate")
+            },
+            "sessions": {
+                "active": self.sessions,
+                "opened": self.sessions_opened,
+                "rejected": self.sessions_rejected,
+                "recent": self._recent(self._session_events, "opened", "rejected", "rejected_rate")
+            },
+            "uptime": time.time() - self.started_at
+        }
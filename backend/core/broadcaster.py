@@ -0,0 +1,122 @@
+import asyncio
+from typing import Dict, Optional, Set
+from loguru import logger
+
+from .types import SleepData
+
+
+def serialize_sleep_data(sleep_data: SleepData) -> Dict:
+    """SleepDataを購読者へ配信できるJSON互換のdictに変換"""
+    return {
+        "state": sleep_data.state.value,
+        "confidence": sleep_data.confidence,
+        "position": sleep_data.position,
+        "orientation": sleep_data.orientation,
+        "timestamp": sleep_data.timestamp,
+        "boxes": sleep_data.boxes,
+        "alarm": {
+            "volume": sleep_data.alarm.volume,
+            "frequency": sleep_data.alarm.frequency,
+            "fade_duration": sleep_data.alarm.fade_duration
+        }
+    }
+
+
+class Subscription:
+    """1購読者分の有界キュー"""
+
+    def __init__(self, channel: str, max_queue_size: int):
+        self.channel = channel
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self.dropped = 0
+
+    def offer(self, message: Dict) -> None:
+        """キューが満杯の場合は最も古いメッセージを捨てて最新を入れる"""
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+    async def get(self) -> Dict:
+        return await self.queue.get()
+
+
+class Broadcaster:
+    """カメラチャンネル単位で解析結果を複数の購読者へ配信する"""
+
+    DEFAULT_QUEUE_SIZE = 16
+
+    def __init__(self, max_queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.max_queue_size = max_queue_size
+        self.channels: Dict[str, Set[Subscription]] = {}
+        self.producers: Set[str] = set()
+        self.last_messages: Dict[str, Dict] = {}
+        logger.info(f"Broadcaster initialized with queue size: {max_queue_size}")
+
+    def register_producer(self, channel: str) -> bool:
+        """チャンネルのプロデューサーを登録（1チャンネルにつき1つまで）"""
+        if channel in self.producers:
+            logger.warning(f"Producer already registered for channel: {channel}")
+            return False
+        self.producers.add(channel)
+        logger.info(f"Producer registered for channel: {channel}")
+        return True
+
+    def unregister_producer(self, channel: str) -> None:
+        self.producers.discard(channel)
+        # プロデューサー不在のチャンネルで古い状態を配信しないよう直近の結果も破棄する
+        self.last_messages.pop(channel, None)
+        logger.info(f"Producer unregistered for channel: {channel}")
+
+    def subscribe(self, channel: str) -> Subscription:
+        subscription = Subscription(channel, self.max_queue_size)
+        self.channels.setdefault(channel, set()).add(subscription)
+
+        # 途中参加の購読者にも直近の状態をすぐに届ける
+        last_message = self.last_messages.get(channel)
+        if last_message is not None:
+            subscription.offer(last_message)
+
+        logger.info(
+            f"Subscriber added to channel {channel} "
+            f"(subscribers={len(self.channels[channel])})"
+        )
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self.channels.get(subscription.channel)
+        if not subscribers:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self.channels[subscription.channel]
+        if subscription.dropped:
+            logger.warning(
+                f"Subscriber left channel {subscription.channel} "
+                f"after dropping {subscription.dropped} messages"
+            )
+        logger.info(f"Subscriber removed from channel {subscription.channel}")
+
+    def publish(self, channel: str, message: Dict) -> int:
+        """メッセージを全購読者へ配信し、配信先の数を返す（プロデューサーは待たされない）"""
+        if channel in self.producers:
+            self.last_messages[channel] = message
+        subscribers = self.channels.get(channel, set())
+        for subscription in list(subscribers):
+            subscription.offer(message)
+        logger.debug(f"Published to channel {channel}: subscribers={len(subscribers)}")
+        return len(subscribers)
+
+    def get_channel_stats(self, channel: Optional[str] = None) -> Dict:
+        names = [channel] if channel else sorted(set(self.channels) | self.producers)
+        return {
+            name: {
+                "has_producer": name in self.producers,
+                "subscribers": len(self.channels.get(name, set())),
+                "dropped": sum(s.dropped for s in self.channels.get(name, set()))
+            }
+            for name in names
+        }
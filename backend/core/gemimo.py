@@ -63,7 +63,8 @@ class GemiMo:
             
             sleep_data.alarm = AlarmParameters(
                 volume=alarm_params["volume"],
-                frequency=alarm_params["frequency"]
+                frequency=alarm_params["frequency"],
+                fade_duration=alarm_params["fade_duration"]
             )
             
             return sleep_data
@@ -1,3 +1,4 @@
+import asyncio
 import google.generativeai as genai
 from PIL import Image
 from loguru import logger
@@ -47,8 +48,8 @@ class GeminiAPI:
 
     async def detect_pose(self, frame: Image.Image) -> dict:
         try:
-            # Geminiへのプロンプト
-            response = self.model.generate_content([
+            # Geminiへのプロンプト（同期APIのためイベントループを塞がないよう別スレッドで実行）
+            response = await asyncio.to_thread(self.model.generate_content, [
                 frame,
                 """
                 Analyze the image and detect objects with their 3D positions and dimensions.
@@ -18,6 +18,7 @@ class Box3D(TypedDict):
 class AlarmParameters:
     volume: float
     frequency: float
+    fade_duration: float = 0.0
 
 @dataclass
 class SleepData:
@@ -1,6 +1,8 @@
 import uvicorn
-from fastapi import FastAPI, WebSocket, UploadFile, File
+import asyncio
+from fastapi import FastAPI, WebSocket, UploadFile, File, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse
 from loguru import logger
 from PIL import Image
 import io
@@ -13,6 +15,9 @@ from datetime import datetime
 # パスの設定を修正
 sys.path.append(str(Path(__file__).parent))
 from core.gemimo import GemiMo
+from core.types import SleepData
+from core.broadcaster import Broadcaster, serialize_sleep_data
+from core.admission import AdmissionController, AdmissionRejected, PayloadTooLarge
 
 app = FastAPI(title="GemiMo API")
 
@@ -28,10 +33,62 @@ app.add_middleware(
 CAPTURES_DIR = Path("captures")
 CAPTURES_DIR.mkdir(exist_ok=True)
 
+# カメラチャンネルの配信設定
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("GEMIMO_SUBSCRIBER_QUEUE_SIZE", "16"))
+SSE_KEEPALIVE_SECONDS = 15.0
+broadcaster = Broadcaster(max_queue_size=SUBSCRIBER_QUEUE_SIZE)
+
+# 解析処理の受付制限（超過分は503やWebSocketのクローズで早期に破棄する）
+admission = AdmissionController(
+    max_inflight=int(os.getenv("GEMIMO_MAX_INFLIGHT", "4")),
+    max_waiting=int(os.getenv("GEMIMO_MAX_WAITING", "4")),
+    max_queued_bytes=int(os.getenv("GEMIMO_MAX_QUEUED_BYTES", str(256 * 1024 * 1024))),
+    max_sessions=int(os.getenv("GEMIMO_MAX_SESSIONS", "8")),
+    queue_timeout=float(os.getenv("GEMIMO_QUEUE_TIMEOUT", "0.5")),
+    retry_after=int(os.getenv("GEMIMO_RETRY_AFTER", "5"))
+)
+
+# RFC 6455: サーバー過負荷のため後で再試行してほしい場合のクローズコード
+WS_CLOSE_TRY_AGAIN_LATER = 1013
+
+def estimate_decoded_size(image: Image.Image) -> int:
+    """画像ヘッダーからデコード後のメモリ使用量（バイト）を見積もる（画素データは読み込まない）"""
+    return image.width * image.height * len(image.getbands())
+
+async def process_frame_message(gemimo: GemiMo, data: bytes):
+    """WebSocketで受信したフレームを受付制限の範囲内で解析する"""
+    try:
+        frame = Image.open(io.BytesIO(data))
+    except Exception as e:
+        logger.error(f"Error processing image: {e}")
+        return {"status": "error", "message": str(e)}
+
+    try:
+        async with admission.admit(estimate_decoded_size(frame)):
+            return await gemimo.process_frame(frame)
+    except PayloadTooLarge as e:
+        return {"status": "error", "message": e.reason}
+    except AdmissionRejected as e:
+        return {"status": "error", "message": e.reason, "retry_after": e.retry_after}
+
+async def open_session(websocket: WebSocket) -> bool:
+    """解析セッションの枠を確保し、確保できなければ理由付きでWebSocketを閉じる"""
+    try:
+        admission.open_session()
+        return True
+    except AdmissionRejected as e:
+        await websocket.close(code=WS_CLOSE_TRY_AGAIN_LATER, reason=e.reason)
+        return False
+
 @app.get("/")
 async def root():
     return {"message": "GemiMo API is running"}
 
+@app.get("/api/admission/metrics")
+async def admission_metrics():
+    """受付制限の設定値と破棄件数を返す"""
+    return {"admission": admission.get_metrics(), "status": "success"}
+
 @app.post("/api/analyze")
 async def analyze_image(file: UploadFile = File(...)):
     """
@@ -42,47 +99,60 @@ async def analyze_image(file: UploadFile = File(...)):
         
         # 画像の読み込み
         logger.info("Reading uploaded file...")
+        admission.check_capacity()
         contents = await file.read()
         image = Image.open(io.BytesIO(contents))
-        logger.info(f"Image loaded: {image.size}x{image.mode}")
+        async with admission.admit(estimate_decoded_size(image)):
+            logger.info(f"Image loaded: {image.size}x{image.mode}")
         
-        # RGBAの場合はRGBに変換
-        if image.mode == 'RGBA':
-            logger.info("Converting RGBA to RGB...")
-            image = image.convert('RGB')
+            # RGBAの場合はRGBに変換
+            if image.mode == 'RGBA':
+                logger.info("Converting RGBA to RGB...")
+                image = image.convert('RGB')
         
-        # 画像を保存
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        image_path = CAPTURES_DIR / f"capture_{timestamp}.jpg"
-        logger.info(f"Saving capture to {image_path}...")
-        image.save(image_path, 'JPEG')
-        logger.info("Image saved successfully")
+            # 画像を保存
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            image_path = CAPTURES_DIR / f"capture_{timestamp}.jpg"
+            logger.info(f"Saving capture to {image_path}...")
+            image.save(image_path, 'JPEG')
+            logger.info("Image saved successfully")
         
-        # GemiMo処理の実行
-        logger.info("Initializing GemiMo processing...")
-        gemimo = GemiMo()
-        logger.info("Starting frame processing...")
-        result = await gemimo.process_frame(image)
-        logger.info("Frame processing completed")
+            # GemiMo処理の実行
+            logger.info("Initializing GemiMo processing...")
+            gemimo = GemiMo()
+            logger.info("Starting frame processing...")
+            result = await gemimo.process_frame(image)
+            logger.info("Frame processing completed")
         
-        # レスポンスの準備
-        logger.info("Preparing response data...")
-        response_data = {
-            "raw_result": result,
-            "state": result.state.value if result else None,
-            "confidence": result.confidence if result else None,
-            "position": result.position if result else None,
-            "orientation": result.orientation if result else None,
-            "timestamp": result.timestamp if result else None,
-            "boxes": result.boxes if result else None,
-            "alarm": gemimo.alarm_controller.get_alarm_parameters(result) if result else None,
-            "image_path": str(image_path),
-            "status": "success"
-        }
-        logger.info(f"Analysis completed successfully: {json.dumps(response_data, default=str)}")
+            # レスポンスの準備
+            logger.info("Preparing response data...")
+            response_data = {
+                "raw_result": result,
+                "state": result.state.value if result else None,
+                "confidence": result.confidence if result else None,
+                "position": result.position if result else None,
+                "orientation": result.orientation if result else None,
+                "timestamp": result.timestamp if result else None,
+                "boxes": result.boxes if result else None,
+                "alarm": gemimo.alarm_controller.get_alarm_parameters(result) if result else None,
+                "image_path": str(image_path),
+                "status": "success"
+            }
+            logger.info(f"Analysis completed successfully: {json.dumps(response_data, default=str)}")
         
-        return response_data
+            return response_data
         
+    except PayloadTooLarge as e:
+        return JSONResponse(
+            status_code=413,
+            content={"error": e.reason, "status": "error"}
+        )
+    except AdmissionRejected as e:
+        return JSONResponse(
+            status_code=503,
+            content={"error": e.reason, "status": "error"},
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         error_msg = f"Error processing image: {str(e)}"
         logger.error(error_msg)
@@ -90,11 +160,13 @@ async def analyze_image(file: UploadFile = File(...)):
 
 @app.websocket("/ws/gemimo")
 async def gemimo_feed(websocket: WebSocket):
-    gemimo = GemiMo()
     await websocket.accept()
+    if not await open_session(websocket):
+        return
     logger.info("WebSocket connection established")
     
     try:
+        gemimo = GemiMo()
         while True:
             message = await websocket.receive()
             
@@ -102,19 +174,127 @@ async def gemimo_feed(websocket: WebSocket):
             if "text" in message:
                 result = await gemimo.handle_message(message["text"])
             elif "bytes" in message:
-                result = await gemimo.handle_message(message["bytes"])
+                result = await process_frame_message(gemimo, message["bytes"])
             else:
                 logger.warning(f"Unsupported message type: {message}")
                 continue
 
+            if isinstance(result, SleepData):
+                result = serialize_sleep_data(result)
             if result:
                 await websocket.send_json(result)
                 
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
     finally:
+        admission.close_session()
         logger.info("WebSocket connection closed")
 
+@app.get("/api/channels")
+async def list_channels():
+    """カメラチャンネルの一覧と購読状況を返す"""
+    return {"channels": broadcaster.get_channel_stats(), "status": "success"}
+
+@app.websocket("/ws/channels/{channel}/producer")
+async def channel_producer(websocket: WebSocket, channel: str):
+    """
+    カメラチャンネルへフレームを送るプロデューサーセッション
+    解析結果は送信元に返すとともにチャンネルの全購読者へ配信する
+    """
+    await websocket.accept()
+    if not broadcaster.register_producer(channel):
+        await websocket.close(code=1008, reason=f"Channel {channel} already has a producer")
+        return
+    if not await open_session(websocket):
+        broadcaster.unregister_producer(channel)
+        return
+
+    logger.info(f"Producer connection established for channel: {channel}")
+    try:
+        gemimo = GemiMo()
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            if "text" in message and message["text"] is not None:
+                result = await gemimo.handle_message(message["text"])
+            elif "bytes" in message and message["bytes"] is not None:
+                result = await process_frame_message(gemimo, message["bytes"])
+            else:
+                logger.warning(f"Unsupported message type: {message}")
+                continue
+
+            if isinstance(result, SleepData):
+                payload = serialize_sleep_data(result)
+                broadcaster.publish(channel, payload)
+                await websocket.send_json(payload)
+            elif result:
+                await websocket.send_json(result)
+
+    except Exception as e:
+        logger.error(f"Producer WebSocket error on channel {channel}: {e}")
+    finally:
+        admission.close_session()
+        broadcaster.unregister_producer(channel)
+        logger.info(f"Producer connection closed for channel: {channel}")
+
+@app.websocket("/ws/channels/{channel}")
+async def channel_subscriber(websocket: WebSocket, channel: str):
+    """カメラチャンネルの解析結果を受信する購読者セッション"""
+    await websocket.accept()
+    subscription = broadcaster.subscribe(channel)
+
+    async def forward():
+        while True:
+            await websocket.send_json(await subscription.get())
+
+    async def wait_for_disconnect():
+        # 購読者からの入力は使わないが、切断を検知するために受信し続ける
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+    sender = asyncio.create_task(forward())
+    receiver = asyncio.create_task(wait_for_disconnect())
+    try:
+        done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception():
+                logger.error(f"Subscriber WebSocket error on channel {channel}: {task.exception()}")
+    finally:
+        for task in (sender, receiver):
+            task.cancel()
+        await asyncio.gather(sender, receiver, return_exceptions=True)
+        broadcaster.unsubscribe(subscription)
+        logger.info(f"Subscriber connection closed for channel: {channel}")
+
+@app.get("/api/channels/{channel}/events")
+async def channel_events(request: Request, channel: str):
+    """カメラチャンネルの解析結果をServer-Sent Eventsで配信する"""
+
+    async def event_stream():
+        # ストリーム開始前に切断された場合に購読が残らないよう、生成器の中で購読する
+        subscription = broadcaster.subscribe(channel)
+        try:
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(subscription.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {json.dumps(message, default=str)}\n\n"
+        finally:
+            broadcaster.unsubscribe(subscription)
+            logger.info(f"SSE stream closed for channel: {channel}")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
 if __name__ == "__main__":
     logger.info("Starting GemiMo server...")
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True, log_level="info")
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# main.pyと同じくbackend直下を基準に core パッケージを読み込む
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,144 @@
+import asyncio
+import time
+
+import pytest
+
+from core.admission import AdmissionController, AdmissionRejected, PayloadTooLarge
+
+
+async def analyze(controller: AdmissionController, size: int = 1, duration: float = 0.3) -> str:
+    try:
+        async with controller.admit(size):
+            # Gemini呼び出しと同様に同期処理を別スレッドで実行する
+            await asyncio.to_thread(time.sleep, duration)
+            return "ok"
+    except AdmissionRejected:
+        return "shed"
+
+
+def test_excess_requests_are_shed_immediately():
+    controller = AdmissionController(max_inflight=2, max_waiting=1, queue_timeout=5.0)
+
+    async def scenario():
+        started = time.monotonic()
+        tasks = [asyncio.create_task(analyze(controller)) for _ in range(6)]
+        await asyncio.sleep(0.05)
+        # 実行中2件・待機中1件を除いた3件はGeminiの完了を待たずに破棄される
+        assert sum(task.done() for task in tasks) == 3
+        assert time.monotonic() - started < 0.3
+        return await asyncio.gather(*tasks)
+
+    results = asyncio.run(scenario())
+
+    assert results.count("ok") == 3
+    assert results.count("shed") == 3
+    assert controller.shed["queue_full"] == 3
+    assert controller.inflight == 0
+    assert controller.waiting == 0
+    assert controller.queued_bytes == 0
+
+
+def test_waiting_request_times_out():
+    controller = AdmissionController(max_inflight=1, max_waiting=1, queue_timeout=0.1)
+
+    async def scenario():
+        return await asyncio.gather(analyze(controller), analyze(controller))
+
+    results = asyncio.run(scenario())
+
+    assert sorted(results) == ["ok", "shed"]
+    assert controller.shed["timeout"] == 1
+    assert controller.waiting == 0
+
+
+def test_queued_bytes_limit():
+    controller = AdmissionController(max_inflight=4, max_queued_bytes=100)
+
+    async def scenario():
+        return await asyncio.gather(
+            analyze(controller, size=60),
+            analyze(controller, size=60),
+            analyze(controller, size=40)
+        )
+
+    results = asyncio.run(scenario())
+
+    assert results == ["ok", "shed", "ok"]
+    assert controller.shed["queued_bytes"] == 1
+    assert controller.queued_bytes == 0
+
+
+def test_session_limit():
+    controller = AdmissionController(max_sessions=1)
+
+    controller.open_session()
+    with pytest.raises(AdmissionRejected):
+        controller.open_session()
+    controller.close_session()
+    controller.open_session()
+
+    assert controller.sessions == 1
+
+
+def test_oversized_image_is_not_retryable():
+    controller = AdmissionController(max_queued_bytes=100)
+
+    async def scenario():
+        async with controller.admit(101):
+            pass
+
+    with pytest.raises(PayloadTooLarge) as exc_info:
+        asyncio.run(scenario())
+
+    assert exc_info.value.retry_after is None
+    assert controller.shed["too_large"] == 1
+    assert controller.shed["queued_bytes"] == 0
+    assert controller.queued_bytes == 0
+
+
+def test_check_capacity_rejects_without_waiting():
+    controller = AdmissionController(max_inflight=1, max_waiting=0, queue_timeout=5.0)
+
+    async def scenario():
+        task = asyncio.create_task(analyze(controller))
+        await asyncio.sleep(0.05)
+        with pytest.raises(AdmissionRejected) as exc_info:
+            controller.check_capacity()
+        assert exc_info.value.retry_after == controller.retry_after
+        await task
+        controller.check_capacity()
+
+    asyncio.run(scenario())
+
+    assert controller.shed["queue_full"] == 1
+
+
+def test_metrics_report_each_resource_separately():
+    controller = AdmissionController(max_sessions=1)
+
+    controller.open_session()
+    with pytest.raises(AdmissionRejected):
+        controller.open_session()
+    asyncio.run(analyze(controller, duration=0.0))
+
+    metrics = controller.get_metrics()
+
+    assert metrics["sessions"]["opened"] == 1
+    assert metrics["sessions"]["rejected"] == 1
+    assert metrics["sessions"]["recent"]["rejected_rate"] == 0.5
+    assert metrics["analyses"]["admitted"] == 1
+    assert metrics["analyses"]["recent"]["shed_rate"] == 0.0
+
+
+def test_recent_rate_forgets_events_outside_window():
+    controller = AdmissionController(max_queued_bytes=100, metrics_window=0.1)
+
+    asyncio.run(analyze(controller, size=101))
+    assert controller.get_metrics()["analyses"]["recent"]["shed_rate"] == 1.0
+
+    time.sleep(0.15)
+    asyncio.run(analyze(controller, duration=0.0))
+
+    metrics = controller.get_metrics()
+    assert metrics["analyses"]["recent"] == {"admitted": 1, "shed": 0, "shed_rate": 0.0}
+    assert metrics["analyses"]["shed"]["too_large"] == 1
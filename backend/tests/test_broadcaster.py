@@ -0,0 +1,97 @@
+import asyncio
+
+from core.broadcaster import Broadcaster
+
+
+def message(n: int) -> dict:
+    return {"state": "SLEEPING", "seq": n}
+
+
+def drain(subscription) -> list:
+    received = []
+    while not subscription.queue.empty():
+        received.append(subscription.queue.get_nowait())
+    return received
+
+
+def test_overflow_drops_oldest_and_counts():
+    broadcaster = Broadcaster(max_queue_size=2)
+    broadcaster.register_producer("bedroom")
+    subscription = broadcaster.subscribe("bedroom")
+
+    for n in range(5):
+        broadcaster.publish("bedroom", message(n))
+
+    assert subscription.dropped == 3
+    assert [m["seq"] for m in drain(subscription)] == [3, 4]
+    assert broadcaster.get_channel_stats("bedroom")["bedroom"]["dropped"] == 3
+
+
+def test_slow_subscriber_does_not_affect_others():
+    broadcaster = Broadcaster(max_queue_size=1)
+    broadcaster.register_producer("bedroom")
+    slow = broadcaster.subscribe("bedroom")
+    fast = broadcaster.subscribe("bedroom")
+
+    async def scenario():
+        broadcaster.publish("bedroom", message(0))
+        assert (await fast.get())["seq"] == 0
+        broadcaster.publish("bedroom", message(1))
+        assert (await fast.get())["seq"] == 1
+
+    asyncio.run(scenario())
+    assert fast.dropped == 0
+    assert slow.dropped == 1
+    assert [m["seq"] for m in drain(slow)] == [1]
+
+
+def test_late_subscriber_receives_last_message():
+    broadcaster = Broadcaster()
+    broadcaster.register_producer("bedroom")
+    broadcaster.publish("bedroom", message(0))
+    broadcaster.publish("bedroom", message(1))
+
+    subscription = broadcaster.subscribe("bedroom")
+
+    assert [m["seq"] for m in drain(subscription)] == [1]
+
+
+def test_no_replay_after_producer_leaves():
+    broadcaster = Broadcaster()
+    broadcaster.register_producer("bedroom")
+    broadcaster.publish("bedroom", message(0))
+    broadcaster.unregister_producer("bedroom")
+
+    subscription = broadcaster.subscribe("bedroom")
+
+    assert drain(subscription) == []
+    assert broadcaster.last_messages == {}
+
+
+def test_publish_without_producer_is_not_retained():
+    broadcaster = Broadcaster()
+    broadcaster.publish("unknown", message(0))
+
+    assert broadcaster.last_messages == {}
+
+
+def test_unsubscribe_removes_empty_channel():
+    broadcaster = Broadcaster()
+    first = broadcaster.subscribe("bedroom")
+    second = broadcaster.subscribe("bedroom")
+
+    broadcaster.unsubscribe(first)
+    assert broadcaster.get_channel_stats("bedroom")["bedroom"]["subscribers"] == 1
+
+    broadcaster.unsubscribe(second)
+    assert "bedroom" not in broadcaster.channels
+    assert broadcaster.publish("bedroom", message(0)) == 0
+
+
+def test_single_producer_per_channel():
+    broadcaster = Broadcaster()
+
+    assert broadcaster.register_producer("bedroom")
+    assert not broadcaster.register_producer("bedroom")
+    broadcaster.unregister_producer("bedroom")
+    assert broadcaster.register_producer("bedroom")